@@ -1,33 +1,237 @@
-import requests
+import httpx
+import diskcache
 import os
-import json
-from datetime import datetime, timedelta
+import orjson
+import math
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit, urlunsplit, parse_qs, urlencode
 import time
+import random
+import threading
+from functools import lru_cache
+from collections import deque
+from itertools import islice
+from operator import itemgetter
+from bisect import bisect_left
+from array import array
 import logging
+import queue
+import atexit
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.FileHandler("connector.log"), logging.StreamHandler()]
-)
+# Set up logging: callers only enqueue records, a background listener thread writes them out
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [
+    RotatingFileHandler("connector.log", maxBytes=10 * 1024 * 1024, backupCount=5),
+    logging.StreamHandler()
+]
+for handler in log_handlers:
+    handler.setFormatter(log_formatter)
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+# The queue handler only merges the message; the listener's handlers apply the full format
+logging.basicConfig(level=logging.INFO, format='%(message)s', handlers=[QueueHandler(log_queue)])
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger("drchrono-acuity-connector")
+# httpx logs every request at INFO; keep per-request lines out of the connector log
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Default for optional prefetched values, so an explicit None isn't mistaken for "not prefetched"
+_NOT_PROVIDED = object()
+
+# Request bodies are serialized with orjson, so the content type is set explicitly
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Appointments starting within this many seconds of each other are candidates for duplicates
+DUPLICATE_WINDOW_SECONDS = 300
+
+# Reference point for comparing appointment wall-clock times as integers
+WALL_CLOCK_EPOCH = datetime(1970, 1, 1)
+
+# How long fetched DrChrono patient records are reused before being fetched again
+PATIENT_CACHE_TTL_SECONDS = 300
+
+# How long patient records persist in the on-disk cache across restarts
+PATIENT_DISK_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# How long a patient missing from the patient listing is fetched individually instead of via the listing
+UNLISTED_PATIENT_TTL_SECONDS = 24 * 60 * 60
+
+# Patient fields the connector actually reads; only these are cached
+CACHED_PATIENT_FIELDS = ('id', 'first_name', 'last_name', 'email', 'phone')
+
+# Maximum number of GET responses kept for conditional revalidation
+HTTP_CACHE_MAX_ENTRIES = 256
+
+# How long the Acuity appointment type list is reused before being fetched again
+APPOINTMENT_TYPES_TTL_SECONDS = 600
+
+# Upper bound on how far the sync interval is stretched when nothing is changing
+MAX_IDLE_BACKOFF = 4
+
+# How long verified credentials are trusted before re-authenticating (a 401 forces it sooner)
+AUTH_REVALIDATE_SECONDS = 3600
+
+# Rate limiting and retry policy for every API request
+MAX_REQUESTS_IN_FLIGHT_PER_HOST = 8
+MAX_REQUESTS_PER_SECOND = 30
+MAX_REQUEST_ATTEMPTS = 4
+REQUEST_BACKOFF_SECONDS = 0.5
+MAX_RETRY_AFTER_SECONDS = 120
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing up to `rate` requests per `period` seconds"""
+    def __init__(self, rate, period=1.0):
+        self.capacity = rate
+        self.tokens = rate
+        self.fill_rate = rate / period
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.fill_rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_seconds = (1 - self.tokens) / self.fill_rate
+            time.sleep(wait_seconds)
+
+
+@lru_cache(maxsize=4096)
+def parse_iso_datetime(value):
+    """Parse an ISO 8601 datetime string from either API, memoized since the same strings recur across syncs"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+@lru_cache(maxsize=4096)
+def iso_to_wall_clock_seconds(value):
+    """Convert an ISO 8601 datetime string to whole seconds of its wall-clock time for cheap integer comparisons"""
+    # Acuity times carry an offset but DrChrono times are naive practice-local, so drop the offset
+    # (as to_drchrono_scheduled_time does) instead of interpreting either side in the server's time zone
+    return int((parse_iso_datetime(value).replace(tzinfo=None) - WALL_CLOCK_EPOCH).total_seconds())
+
+
+@lru_cache(maxsize=4096)
+def to_drchrono_scheduled_time(value):
+    """Convert an Acuity ISO 8601 datetime to DrChrono's scheduled_time format (local wall-clock time, no offset)"""
+    return parse_iso_datetime(value).replace(tzinfo=None).isoformat(timespec='seconds')
+
 
 class DrChronoAcuityConnector:
-    def __init__(self, drchrono_api_key, acuity_user_id, acuity_api_key):
+    def __init__(self, drchrono_api_key, acuity_user_id, acuity_api_key, max_concurrency=10,
+                 patient_cache_dir='.patient_cache'):
         self.drchrono_api_key = drchrono_api_key
         self.acuity_user_id = acuity_user_id
         self.acuity_api_key = acuity_api_key
         self.drchrono_headers = {'Authorization': f'Bearer {drchrono_api_key}'}
         self.acuity_auth = (acuity_user_id, acuity_api_key)
+        self.max_concurrency = max_concurrency  # Maximum number of in-flight API calls during a sync
+        self.page_prefetch_workers = 8  # Maximum number of DrChrono pages fetched in parallel
+        self._patient_cache = {}  # patient_id -> (fetched_at, patient record)
+        self._unlisted_patients = {}  # patient_id -> when the patient listing last failed to include it
+        # Persistent patient cache so restarts don't refetch every record; disabled when no directory is given
+        self.patient_disk_cache = diskcache.Cache(patient_cache_dir) if patient_cache_dir else None
+        self._http_cache = {}  # request URL -> (ETag, Last-Modified, parsed body)
+        self._http_cache_lock = threading.Lock()
+        self._apt_types = None  # Acuity appointment types, refreshed every APPOINTMENT_TYPES_TTL_SECONDS
+        self._apt_types_fetched_at = 0
+        self._apt_type_by_reason = {}  # lowercased DrChrono reason -> Acuity appointmentTypeID
+        self._apt_types_lock = threading.Lock()
+        self.trigger_event = threading.Event()  # Set by trigger_sync() to cut the current wait short
+        self._auth_validated_at = None  # When both sets of credentials were last verified
+
+        # Network calls run on this pool; conversions run on the calling thread as results arrive
+        self.io_executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+        # Share one HTTP/2 client so concurrent requests to each host are multiplexed over one TLS connection
+        self.session = httpx.Client(
+            transport=httpx.HTTPTransport(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=2 * MAX_REQUESTS_IN_FLIGHT_PER_HOST,
+                    max_keepalive_connections=2 * MAX_REQUESTS_IN_FLIGHT_PER_HOST
+                ),
+                # Connection-level retries only; status-based retries are handled by _request
+                retries=3
+            ),
+            timeout=30,
+            follow_redirects=True
+        )
 
+        # Per-host concurrency caps and request rate limits applied by _request, created on first use
+        self._host_limits = {}
+        self._host_limits_lock = threading.Lock()
+
+    def _request(self, method, url, **kwargs):
+        """Send an API request within the host's rate limits, retrying throttled (429) and failed (5xx) GET requests"""
+        semaphore, rate_limiter = self._get_host_limits(urlsplit(url).hostname)
+        
+        for attempt in range(MAX_REQUEST_ATTEMPTS):
+            rate_limiter.acquire()
+            with semaphore:
+                response = self.session.request(method, url, **kwargs)
+            
+            if response.status_code == 401:
+                # Credentials were rejected; make the next sync cycle re-authenticate
+                self._auth_validated_at = None
+                return response
+            elif response.status_code == 429:
+                delay = self._retry_after_seconds(response, attempt)
+            elif response.status_code >= 500 and method == 'GET':
+                delay = REQUEST_BACKOFF_SECONDS * 2 ** attempt
+            else:
+                # Success, 304, other client errors and failed POSTs (which may have been applied) go straight back
+                return response
+            
+            if attempt + 1 < MAX_REQUEST_ATTEMPTS:
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f} seconds")
+                time.sleep(delay)
+        
+        return response
+    
+    def _get_host_limits(self, host):
+        """Return the (concurrency semaphore, rate limiter) pair for a host, e.g. one a pagination link points at"""
+        with self._host_limits_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = (
+                    threading.BoundedSemaphore(MAX_REQUESTS_IN_FLIGHT_PER_HOST),
+                    RateLimiter(MAX_REQUESTS_PER_SECOND)
+                )
+            return self._host_limits[host]
+    
+    @staticmethod
+    def _retry_after_seconds(response, attempt):
+        """Seconds to wait before retrying a throttled request, honoring the Retry-After header when present"""
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return min(max(delay, 0), MAX_RETRY_AFTER_SECONDS)
+        
+        return REQUEST_BACKOFF_SECONDS * 2 ** attempt
+    
     def authenticate_drchrono(self):
         """Authenticate with DrChrono API and return user data"""
         logger.info("Authenticating with DrChrono")
-        response = requests.get('https://drchrono.com/api/users/current', headers=self.drchrono_headers)
+        response = self._request('GET', 'https://drchrono.com/api/users/current', headers=self.drchrono_headers)
         if response.status_code == 200:
             logger.info("DrChrono authentication successful")
-            return response.json()
+            return orjson.loads(response.content)
         else:
             error_msg = f"Failed to authenticate with DrChrono: {response.status_code} - {response.text}"
             logger.error(error_msg)
@@ -36,20 +240,30 @@ class DrChronoAcuityConnector:
     def authenticate_acuity(self):
         """Authenticate with Acuity API and return user data"""
         logger.info("Authenticating with Acuity")
-        response = requests.get(
+        response = self._request(
+            'GET',
             f'https://acuityscheduling.com/api/v1/users/{self.acuity_user_id}', 
             auth=self.acuity_auth
         )
         if response.status_code == 200:
             logger.info("Acuity authentication successful")
-            return response.json()
+            return orjson.loads(response.content)
         else:
             error_msg = f"Failed to authenticate with Acuity: {response.status_code} - {response.text}"
             logger.error(error_msg)
             raise Exception(error_msg)
 
+    def ensure_authenticated(self):
+        """Verify both sets of credentials unless they were verified recently and no request has been rejected since"""
+        if self._auth_validated_at is not None and time.time() - self._auth_validated_at < AUTH_REVALIDATE_SECONDS:
+            return
+        
+        self.authenticate_drchrono()
+        self.authenticate_acuity()
+        self._auth_validated_at = time.time()
+
     def get_drchrono_appointments(self, start_date=None, end_date=None):
-        """Fetch appointments from DrChrono within date range"""
+        """Yield appointments from DrChrono within date range, streaming them page by page"""
         if not start_date:
             start_date = datetime.now().strftime('%Y-%m-%d')
         if not end_date:
@@ -62,23 +276,118 @@ class DrChronoAcuityConnector:
             'page_size': 100
         }
         
-        all_appointments = []
-        url = 'https://drchrono.com/api/appointments'
-        
-        while url:
-            response = requests.get(url, headers=self.drchrono_headers, params=params)
-            if response.status_code != 200:
-                error_msg = f"Failed to fetch DrChrono appointments: {response.status_code} - {response.text}"
-                logger.error(error_msg)
-                raise Exception(error_msg)
-                
-            data = response.json()
-            all_appointments.extend(data['results'])
-            url = data['next']
-            params = {}  # Clear params for subsequent requests
+        appointment_count = 0
+        for appointment in self._iter_drchrono_paginated(
+            'https://drchrono.com/api/appointments', params, 'DrChrono appointments'
+        ):
+            appointment_count += 1
+            yield appointment
             
-        logger.info(f"Retrieved {len(all_appointments)} appointments from DrChrono")
-        return all_appointments
+        logger.info(f"Retrieved {appointment_count} appointments from DrChrono")
+
+    def _iter_drchrono_paginated(self, url, params, description, conditional=True):
+        """Yield every result of a DrChrono list endpoint, prefetching a bounded window of pages when possible"""
+        data = self._get_drchrono_page(url, params, description, conditional)
+        page_urls = self._drchrono_page_urls(data.get('next'), data.get('count'), len(data['results']))
+        
+        if not page_urls:
+            # Cursor pagination: each page only reveals the next one
+            yield from data['results']
+            next_url = data.get('next')
+            while next_url:
+                data = self._get_drchrono_page(next_url, None, description, conditional)
+                yield from data['results']
+                next_url = data.get('next')
+            return
+        
+        # Page numbers are known up front, so keep a window of pages in flight while earlier ones are consumed
+        with ThreadPoolExecutor(max_workers=self.page_prefetch_workers) as executor:
+            remaining_urls = iter(page_urls)
+            pending = deque(
+                executor.submit(self._get_drchrono_page, page_url, None, description, conditional)
+                for page_url in islice(remaining_urls, self.page_prefetch_workers)
+            )
+            try:
+                yield from data['results']
+                while pending:
+                    page = pending.popleft().result()
+                    next_url = next(remaining_urls, None)
+                    if next_url:
+                        pending.append(executor.submit(self._get_drchrono_page, next_url, None, description, conditional))
+                    yield from page['results']
+            finally:
+                # Don't fetch pages nobody will read if the caller stops early
+                for future in pending:
+                    future.cancel()
+    
+    def _get_drchrono_page(self, url, params, description, conditional=True):
+        """Fetch a single page from a DrChrono list endpoint, optionally through the conditional-GET cache"""
+        if conditional:
+            return self._conditional_get_json(url, description, headers=self.drchrono_headers, params=params)
+        
+        response = self._request('GET', url, headers=self.drchrono_headers, params=params)
+        if response.status_code != 200:
+            error_msg = f"Failed to fetch {description}: {response.status_code} - {response.text}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        
+        return orjson.loads(response.content)
+    
+    def _conditional_get_json(self, url, description, headers=None, params=None, **kwargs):
+        """GET a JSON resource, revalidating any cached copy with ETag/Last-Modified and reusing it on 304"""
+        cache_key = str(httpx.URL(url).copy_merge_params(params or {}))
+        with self._http_cache_lock:
+            cached = self._http_cache.get(cache_key)
+        
+        headers = dict(headers or {})
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        
+        response = self._request('GET', url, headers=headers, params=params, **kwargs)
+        if response.status_code == 304 and cached:
+            return cached[2]
+        
+        if response.status_code != 200:
+            error_msg = f"Failed to fetch {description}: {response.status_code} - {response.text}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        
+        data = orjson.loads(response.content)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            # Page prefetch threads share the cache, so size check, eviction and insert happen under one lock
+            with self._http_cache_lock:
+                if cache_key not in self._http_cache and len(self._http_cache) >= HTTP_CACHE_MAX_ENTRIES:
+                    # Drop the oldest entry; keys go stale as the sync window moves forward
+                    self._http_cache.pop(next(iter(self._http_cache)), None)
+                self._http_cache[cache_key] = (etag, last_modified, data)
+        
+        return data
+    
+    @staticmethod
+    def _drchrono_page_urls(next_url, count, page_size):
+        """Build the URLs of all remaining pages, or None if the API is not paginating by page number"""
+        if not next_url or not count or not page_size:
+            return None
+        
+        parts = urlsplit(next_url)
+        query = parse_qs(parts.query)
+        if 'page' not in query:
+            return None
+        
+        first_page = int(query['page'][0])
+        total_pages = math.ceil(count / page_size)
+        page_urls = []
+        for page in range(first_page, total_pages + 1):
+            query['page'] = [str(page)]
+            page_urls.append(urlunsplit(parts._replace(query=urlencode(query, doseq=True))))
+        
+        return page_urls
 
     def get_acuity_appointments(self, start_date=None, end_date=None):
         """Fetch appointments from Acuity within date range"""
@@ -94,34 +403,30 @@ class DrChronoAcuityConnector:
             'maxDate': end_date
         }
         
-        response = requests.get(
-            'https://acuityscheduling.com/api/v1/appointments', 
+        appointments = self._conditional_get_json(
+            'https://acuityscheduling.com/api/v1/appointments',
+            'Acuity appointments',
             auth=self.acuity_auth,
             params=params
         )
-        
-        if response.status_code != 200:
-            error_msg = f"Failed to fetch Acuity appointments: {response.status_code} - {response.text}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
-            
-        appointments = response.json()
         logger.info(f"Retrieved {len(appointments)} appointments from Acuity")
         return appointments
 
     def create_drchrono_appointment(self, appointment_data):
         """Create a new appointment in DrChrono"""
-        logger.info(f"Creating new appointment in DrChrono: {appointment_data.get('appointment_type', 'Unknown type')}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Creating new appointment in DrChrono: {appointment_data.get('appointment_type', 'Unknown type')}")
         
-        response = requests.post(
+        response = self._request(
+            'POST',
             'https://drchrono.com/api/appointments',
-            headers=self.drchrono_headers,
-            json=appointment_data
+            headers={**self.drchrono_headers, **JSON_HEADERS},
+            content=orjson.dumps(appointment_data)
         )
         
         if response.status_code in [201, 200]:
-            logger.info(f"Successfully created appointment in DrChrono")
-            return response.json()
+            logger.debug("Successfully created appointment in DrChrono")
+            return orjson.loads(response.content)
         else:
             error_msg = f"Failed to create DrChrono appointment: {response.status_code} - {response.text}"
             logger.error(error_msg)
@@ -129,46 +434,46 @@ class DrChronoAcuityConnector:
 
     def create_acuity_appointment(self, appointment_data):
         """Create a new appointment in Acuity"""
-        logger.info(f"Creating new appointment in Acuity for {appointment_data.get('firstName', '')} {appointment_data.get('lastName', '')}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Creating new appointment in Acuity for {appointment_data.get('firstName', '')} {appointment_data.get('lastName', '')}")
         
-        response = requests.post(
+        response = self._request(
+            'POST',
             'https://acuityscheduling.com/api/v1/appointments',
             auth=self.acuity_auth,
-            json=appointment_data
+            headers=JSON_HEADERS,
+            content=orjson.dumps(appointment_data)
         )
         
         if response.status_code in [201, 200]:
-            logger.info(f"Successfully created appointment in Acuity")
-            return response.json()
+            logger.debug("Successfully created appointment in Acuity")
+            return orjson.loads(response.content)
         else:
             error_msg = f"Failed to create Acuity appointment: {response.status_code} - {response.text}"
             logger.error(error_msg)
             raise Exception(error_msg)
     
-    def convert_acuity_to_drchrono(self, acuity_appointment):
+    def convert_acuity_to_drchrono(self, acuity_appointment, patient_id=_NOT_PROVIDED):
         """Convert Acuity appointment format to DrChrono format"""
-        # Extract date and time from Acuity appointment
-        date_obj = datetime.fromisoformat(acuity_appointment.get('datetime').replace('Z', '+00:00'))
-        
         # Calculate duration in minutes
         duration = acuity_appointment.get('duration', 60)  # Default to 60 minutes if not specified
         
         # Format schedule data for DrChrono
         drchrono_data = {
-            'scheduled_time': date_obj.strftime('%Y-%m-%dT%H:%M:%S'),
+            'scheduled_time': to_drchrono_scheduled_time(acuity_appointment.get('datetime')),
             'duration': duration,
             'exam_room': acuity_appointment.get('location', ''),
             'notes': acuity_appointment.get('notes', ''),
             'reason': acuity_appointment.get('type', ''),
             # Patient details would need to be properly mapped
             # This is a simplified example - you'll need to map patient IDs or create patients
-            'patient': self.find_or_create_drchrono_patient(acuity_appointment),
+            'patient': self.find_or_create_drchrono_patient(acuity_appointment) if patient_id is _NOT_PROVIDED else patient_id,
             'status': 'Confirmed'
         }
         
         return drchrono_data
     
-    def convert_drchrono_to_acuity(self, drchrono_appointment):
+    def convert_drchrono_to_acuity(self, drchrono_appointment, appointment_type_id=_NOT_PROVIDED):
         """Convert DrChrono appointment format to Acuity format"""
         # Get patient info from DrChrono
         patient_id = drchrono_appointment.get('patient')
@@ -176,7 +481,8 @@ class DrChronoAcuityConnector:
         
         # Get appointment type ID from Acuity
         # This is a simplified example - you'll need to map appointment types
-        appointment_type_id = self.get_matching_acuity_appointment_type(drchrono_appointment.get('reason', ''))
+        if appointment_type_id is _NOT_PROVIDED:
+            appointment_type_id = self.get_matching_acuity_appointment_type(drchrono_appointment.get('reason', ''))
         
         # Format data for Acuity
         acuity_data = {
@@ -215,39 +521,104 @@ class DrChronoAcuityConnector:
     
     def create_drchrono_patient(self, patient_data):
         """Create a new patient in DrChrono"""
-        logger.info(f"Creating new patient in DrChrono: {patient_data.get('first_name')} {patient_data.get('last_name')}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Creating new patient in DrChrono: {patient_data.get('first_name')} {patient_data.get('last_name')}")
         
-        response = requests.post(
+        response = self._request(
+            'POST',
             'https://drchrono.com/api/patients',
-            headers=self.drchrono_headers,
-            json=patient_data
+            headers={**self.drchrono_headers, **JSON_HEADERS},
+            content=orjson.dumps(patient_data)
         )
         
         if response.status_code in [201, 200]:
-            logger.info(f"Successfully created patient in DrChrono")
-            return response.json().get('id')
+            logger.debug("Successfully created patient in DrChrono")
+            return orjson.loads(response.content).get('id')
         else:
             error_msg = f"Failed to create DrChrono patient: {response.status_code} - {response.text}"
             logger.error(error_msg)
             raise Exception(error_msg)
     
     def get_drchrono_patient(self, patient_id):
-        """Fetch patient details from DrChrono"""
-        logger.info(f"Fetching patient {patient_id} from DrChrono")
+        """Fetch patient details from DrChrono, reusing recently fetched records"""
+        cached = self._get_cached_patient(patient_id)
+        if cached is not None:
+            return cached
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Fetching patient {patient_id} from DrChrono")
         
-        response = requests.get(
+        response = self._request(
+            'GET',
             f'https://drchrono.com/api/patients/{patient_id}',
             headers=self.drchrono_headers
         )
         
         if response.status_code == 200:
-            logger.info(f"Successfully retrieved patient from DrChrono")
-            return response.json()
+            logger.debug("Successfully retrieved patient from DrChrono")
+            return self._cache_patient(patient_id, orjson.loads(response.content))
         else:
             error_msg = f"Failed to fetch DrChrono patient: {response.status_code} - {response.text}"
             logger.error(error_msg)
             raise Exception(error_msg)
     
+    def get_drchrono_patients_bulk(self, patient_ids):
+        """Fetch several patients from DrChrono with one paginated list request, returning them by ID"""
+        now = time.time()
+        patients = {}
+        missing_ids = set()
+        for patient_id in patient_ids:
+            if patient_id is None:
+                continue
+            cached = self._get_cached_patient(patient_id)
+            if cached is not None:
+                patients[patient_id] = cached
+            elif now - self._unlisted_patients.get(patient_id, 0) >= UNLISTED_PATIENT_TTL_SECONDS:
+                # Patients recently missing from the listing are left to the per-ID lookup
+                missing_ids.add(patient_id)
+        
+        if missing_ids:
+            logger.info(f"Fetching {len(missing_ids)} patients from DrChrono")
+            # Plain GETs: full directory pages must not be kept in the conditional-GET cache
+            for patient in self._iter_drchrono_paginated(
+                'https://drchrono.com/api/patients', {'page_size': 100}, 'DrChrono patients', conditional=False
+            ):
+                if patient.get('id') in missing_ids:
+                    patients[patient['id']] = self._cache_patient(patient['id'], patient)
+                    missing_ids.discard(patient['id'])
+                    if not missing_ids:
+                        # Stop paging as soon as every requested patient has been found
+                        break
+            
+            # Remember patients the listing didn't include so later syncs don't rescan the whole directory for them
+            for patient_id in missing_ids:
+                self._unlisted_patients[patient_id] = now
+            logger.info(f"Retrieved {len(patients)} patients from DrChrono")
+        
+        return patients
+    
+    def _get_cached_patient(self, patient_id):
+        """Return a cached patient record from memory or the on-disk cache, or None if it needs fetching"""
+        cached = self._patient_cache.get(patient_id)
+        if cached and time.time() - cached[0] < PATIENT_CACHE_TTL_SECONDS:
+            return cached[1]
+        
+        if self.patient_disk_cache is not None:
+            patient = self.patient_disk_cache.get(patient_id)
+            if patient is not None:
+                self._patient_cache[patient_id] = (time.time(), patient)
+                return patient
+        
+        return None
+    
+    def _cache_patient(self, patient_id, patient):
+        """Store the patient fields used by the connector in the memory and on-disk caches"""
+        patient = {field: patient.get(field, '') for field in CACHED_PATIENT_FIELDS}
+        self._patient_cache[patient_id] = (time.time(), patient)
+        if self.patient_disk_cache is not None:
+            self.patient_disk_cache.set(patient_id, patient, expire=PATIENT_DISK_CACHE_TTL_SECONDS)
+        return patient
+    
     def get_matching_acuity_appointment_type(self, drchrono_reason):
         """Find matching appointment type in Acuity based on DrChrono reason"""
         # In a real implementation, you would:
@@ -256,28 +627,39 @@ class DrChronoAcuityConnector:
         # 3. Return the appropriate appointmentTypeID
         
         # This is a placeholder implementation
-        response = requests.get(
-            'https://acuityscheduling.com/api/v1/appointment-types',
-            auth=self.acuity_auth
-        )
-        
-        if response.status_code != 200:
-            error_msg = f"Failed to fetch Acuity appointment types: {response.status_code} - {response.text}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
+        reason = drchrono_reason.lower()
+        with self._apt_types_lock:
+            if self._apt_types is None or time.time() - self._apt_types_fetched_at > APPOINTMENT_TYPES_TTL_SECONDS:
+                self._apt_types = self._conditional_get_json(
+                    'https://acuityscheduling.com/api/v1/appointment-types',
+                    'Acuity appointment types',
+                    auth=self.acuity_auth
+                )
+                self._apt_types_fetched_at = time.time()
+                self._apt_type_by_reason = {}
             
-        appointment_types = response.json()
+            # Keep the list and its memo together so a concurrent refresh can't mix IDs from two lists
+            appointment_types = self._apt_types
+            type_by_reason = self._apt_type_by_reason
+            if reason in type_by_reason:
+                return type_by_reason[reason]
         
         # Simple matching logic - improve this based on your specific needs
+        appointment_type_id = None
         for apt_type in appointment_types:
-            if drchrono_reason.lower() in apt_type.get('name', '').lower():
-                return apt_type.get('id')
+            if reason in apt_type.get('name', '').lower():
+                appointment_type_id = apt_type.get('id')
+                break
         
         # Return first appointment type as fallback
-        if appointment_types:
-            return appointment_types[0].get('id')
-        else:
-            raise Exception("No appointment types found in Acuity")
+        if appointment_type_id is None:
+            if appointment_types:
+                appointment_type_id = appointment_types[0].get('id')
+            else:
+                raise Exception("No appointment types found in Acuity")
+        
+        type_by_reason[reason] = appointment_type_id
+        return appointment_type_id
     
     def sync_acuity_to_drchrono(self, days=30):
         """Sync appointments from Acuity to DrChrono"""
@@ -286,43 +668,40 @@ class DrChronoAcuityConnector:
         
         logger.info(f"Starting sync from Acuity to DrChrono ({start_date} to {end_date})")
         
-        # Get appointments from Acuity
-        acuity_appointments = self.get_acuity_appointments(start_date, end_date)
-        
-        # Get existing DrChrono appointments for deduplication
-        drchrono_appointments = self.get_drchrono_appointments(start_date, end_date)
-        
-        # Track created appointments
-        created_count = 0
-        
-        for acuity_apt in acuity_appointments:
-            # Check if appointment already exists in DrChrono
-            # This is a simplified implementation - improve matching logic based on your needs
-            duplicate = False
-            acuity_datetime = datetime.fromisoformat(acuity_apt.get('datetime').replace('Z', '+00:00'))
-            
-            for drchrono_apt in drchrono_appointments:
-                drchrono_datetime = datetime.fromisoformat(drchrono_apt.get('scheduled_time').replace('Z', '+00:00'))
-                time_diff = abs((acuity_datetime - drchrono_datetime).total_seconds())
-                
-                # If appointments are within 5 minutes of each other and have same patient info
-                # consider them duplicates
-                if time_diff < 300 and acuity_apt.get('lastName', '').lower() in drchrono_apt.get('patient_name', '').lower():
-                    duplicate = True
-                    break
-            
-            if not duplicate:
-                try:
-                    # Convert and create in DrChrono
-                    drchrono_data = self.convert_acuity_to_drchrono(acuity_apt)
-                    self.create_drchrono_appointment(drchrono_data)
-                    created_count += 1
-                except Exception as e:
-                    logger.error(f"Error syncing appointment {acuity_apt.get('id')}: {str(e)}")
+        # Get appointments from Acuity while existing DrChrono appointments stream into the deduplication index
+        acuity_future = self.io_executor.submit(self.get_acuity_appointments, start_date, end_date)
+        drchrono_index = self._build_time_index(self.get_drchrono_appointments(start_date, end_date), 'scheduled_time')
+        acuity_appointments = acuity_future.result()
+        
+        new_appointments = [
+            acuity_apt for acuity_apt in acuity_appointments
+            if not self._exists_in_drchrono(acuity_apt, drchrono_index)
+        ]
+        
+        # Resolve patients on the I/O pool and convert each appointment as soon as its patient is known
+        created_count = self._pipeline_create(
+            new_appointments,
+            self.find_or_create_drchrono_patient,
+            self.convert_acuity_to_drchrono,
+            self.create_drchrono_appointment
+        )
         
         logger.info(f"Acuity to DrChrono sync complete. Created {created_count} new appointments.")
         return created_count
     
+    def _exists_in_drchrono(self, acuity_apt, drchrono_index):
+        """Check whether an Acuity appointment already exists in DrChrono"""
+        # This is a simplified implementation - improve matching logic based on your needs
+        acuity_timestamp = iso_to_wall_clock_seconds(acuity_apt.get('datetime'))
+        
+        # If appointments are within 5 minutes of each other and have same patient info
+        # consider them duplicates
+        for drchrono_apt in self._find_nearby_appointments(drchrono_index, acuity_timestamp):
+            if acuity_apt.get('lastName', '').lower() in drchrono_apt.get('patient_name', '').lower():
+                return True
+        
+        return False
+    
     def sync_drchrono_to_acuity(self, days=30):
         """Sync appointments from DrChrono to Acuity"""
         start_date = datetime.now().strftime('%Y-%m-%d')
@@ -330,55 +709,110 @@ class DrChronoAcuityConnector:
         
         logger.info(f"Starting sync from DrChrono to Acuity ({start_date} to {end_date})")
         
-        # Get appointments from DrChrono
-        drchrono_appointments = self.get_drchrono_appointments(start_date, end_date)
+        # Get appointments from DrChrono and existing Acuity appointments for deduplication
+        # The DrChrono list is materialized because every referenced patient is loaded before deduplication
+        acuity_future = self.io_executor.submit(self.get_acuity_appointments, start_date, end_date)
+        drchrono_appointments = list(self.get_drchrono_appointments(start_date, end_date))
+        acuity_index = self._build_time_index(acuity_future.result(), 'datetime')
+        
+        # Load every patient referenced in this window up front so per-appointment lookups hit the cache
+        try:
+            self.get_drchrono_patients_bulk({apt.get('patient') for apt in drchrono_appointments})
+        except Exception as e:
+            # Only a cache warm-up; get_drchrono_patient falls back to per-ID fetches
+            logger.warning(f"Bulk patient lookup failed, fetching patients individually: {str(e)}")
+        
+        new_appointments = [
+            drchrono_apt for drchrono_apt in drchrono_appointments
+            if drchrono_apt.get('scheduled_time') and not self._exists_in_acuity(drchrono_apt, acuity_index)
+        ]
+        
+        # Resolve appointment types on the I/O pool and convert each appointment as soon as its type is known
+        created_count = self._pipeline_create(
+            new_appointments,
+            lambda drchrono_apt: self.get_matching_acuity_appointment_type(drchrono_apt.get('reason', '')),
+            self.convert_drchrono_to_acuity,
+            self.create_acuity_appointment
+        )
         
-        # Get existing Acuity appointments for deduplication
-        acuity_appointments = self.get_acuity_appointments(start_date, end_date)
+        logger.info(f"DrChrono to Acuity sync complete. Created {created_count} new appointments.")
+        return created_count
+    
+    def _exists_in_acuity(self, drchrono_apt, acuity_index):
+        """Check whether a DrChrono appointment already exists in Acuity"""
+        # This is a simplified implementation - improve matching logic based on your needs
+        drchrono_timestamp = iso_to_wall_clock_seconds(drchrono_apt.get('scheduled_time'))
+        
+        # If appointments are within 5 minutes of each other and have similar details
+        # consider them duplicates
+        nearby_appointments = self._find_nearby_appointments(acuity_index, drchrono_timestamp)
+        if nearby_appointments:
+            # Look the patient up once rather than once per candidate
+            last_name = self.get_drchrono_patient(drchrono_apt.get('patient')).get('last_name', '').lower()
+            for acuity_apt in nearby_appointments:
+                if last_name in acuity_apt.get('lastName', '').lower():
+                    return True
+        
+        return False
+    
+    def _pipeline_create(self, appointments, fetch, convert, create):
+        """Fetch per-appointment data on the I/O pool, convert results as they arrive and create them, returning the created count"""
+        fetch_futures = {self.io_executor.submit(fetch, apt): apt for apt in appointments}
+        create_futures = {}
+        
+        # Conversion runs here while the remaining fetches are still in flight
+        for future in as_completed(fetch_futures):
+            apt = fetch_futures[future]
+            try:
+                appointment_data = convert(apt, future.result())
+            except Exception as e:
+                logger.error(f"Error syncing appointment {apt.get('id')}: {str(e)}")
+                continue
+            create_futures[self.io_executor.submit(create, appointment_data)] = apt
         
-        # Track created appointments
         created_count = 0
+        for future in as_completed(create_futures):
+            try:
+                future.result()
+                created_count += 1
+            except Exception as e:
+                logger.error(f"Error syncing appointment {create_futures[future].get('id')}: {str(e)}")
         
-        for drchrono_apt in drchrono_appointments:
-            # Check if appointment already exists in Acuity
-            # This is a simplified implementation - improve matching logic based on your needs
-            duplicate = False
-            
-            if drchrono_apt.get('scheduled_time'):
-                drchrono_datetime = datetime.fromisoformat(drchrono_apt.get('scheduled_time').replace('Z', '+00:00'))
-                
-                for acuity_apt in acuity_appointments:
-                    acuity_datetime = datetime.fromisoformat(acuity_apt.get('datetime').replace('Z', '+00:00'))
-                    time_diff = abs((drchrono_datetime - acuity_datetime).total_seconds())
-                    
-                    # If appointments are within 5 minutes of each other and have similar details
-                    # consider them duplicates
-                    patient_info = self.get_drchrono_patient(drchrono_apt.get('patient'))
-                    if time_diff < 300 and patient_info.get('last_name', '').lower() in acuity_apt.get('lastName', '').lower():
-                        duplicate = True
-                        break
-                
-                if not duplicate:
-                    try:
-                        # Convert and create in Acuity
-                        acuity_data = self.convert_drchrono_to_acuity(drchrono_apt)
-                        self.create_acuity_appointment(acuity_data)
-                        created_count += 1
-                    except Exception as e:
-                        logger.error(f"Error syncing appointment {drchrono_apt.get('id')}: {str(e)}")
-        
-        logger.info(f"DrChrono to Acuity sync complete. Created {created_count} new appointments.")
         return created_count
 
+    @staticmethod
+    def _build_time_index(appointments, time_field):
+        """Sort appointments by start time into a compact timestamp array for window joins, parsing each datetime once"""
+        entries = []
+        for apt in appointments:
+            value = apt.get(time_field)
+            if value:
+                entries.append((iso_to_wall_clock_seconds(value), apt))
+        entries.sort(key=itemgetter(0))
+        
+        return array('q', [timestamp for timestamp, _ in entries]), [apt for _, apt in entries]
+    
+    @staticmethod
+    def _find_nearby_appointments(index, timestamp):
+        """Return indexed appointments starting within the duplicate window of the given timestamp"""
+        timestamps, appointments = index
+        start = bisect_left(timestamps, timestamp - DUPLICATE_WINDOW_SECONDS + 1)
+        end = bisect_left(timestamps, timestamp + DUPLICATE_WINDOW_SECONDS, start)
+        return appointments[start:end]
+
+    def trigger_sync(self):
+        """Wake the sync loop early, e.g. from a webhook handler, instead of waiting for the next interval"""
+        self.trigger_event.set()
+
     def run_bidirectional_sync(self, interval_minutes=60, days_to_sync=30):
         """Run a continuous bidirectional sync between DrChrono and Acuity"""
         logger.info(f"Starting bidirectional sync with {interval_minutes} minute interval")
         
+        idle_cycles = 0
         while True:
             try:
                 # Authenticate with both systems
-                self.authenticate_drchrono()
-                self.authenticate_acuity()
+                self.ensure_authenticated()
                 
                 # Sync appointments in both directions
                 acuity_to_drchrono = self.sync_acuity_to_drchrono(days_to_sync)
@@ -386,25 +820,34 @@ class DrChronoAcuityConnector:
                 
                 logger.info(f"Sync complete. Created {acuity_to_drchrono} appointments in DrChrono and {drchrono_to_acuity} in Acuity.")
                 
+                # Back off while nothing changes: 2x after two idle cycles in a row, up to MAX_IDLE_BACKOFF
+                idle_cycles = idle_cycles + 1 if acuity_to_drchrono + drchrono_to_acuity == 0 else 0
+                backoff = min(2 ** max(idle_cycles - 1, 0), MAX_IDLE_BACKOFF)
+                
                 # Wait for next sync interval
-                logger.info(f"Waiting {interval_minutes} minutes for next sync...")
-                time.sleep(interval_minutes * 60)
+                wait_seconds = interval_minutes * 60 * backoff * random.uniform(0.9, 1.1)
+                logger.info(f"Waiting {wait_seconds / 60:.1f} minutes for next sync...")
                 
             except Exception as e:
                 logger.error(f"Error in sync process: {str(e)}")
-                logger.info(f"Will retry in {interval_minutes} minutes...")
-                time.sleep(interval_minutes * 60)
+                wait_seconds = interval_minutes * 60 * random.uniform(0.9, 1.1)
+                logger.info(f"Will retry in {wait_seconds / 60:.1f} minutes...")
+            
+            if self.trigger_event.wait(wait_seconds):
+                logger.info("Sync triggered early")
+                idle_cycles = 0
+            self.trigger_event.clear()
 
 
 def load_config(config_file='config.json'):
     """Load configuration from file"""
     try:
-        with open(config_file, 'r') as f:
-            return json.load(f)
+        with open(config_file, 'rb') as f:
+            return orjson.loads(f.read())
     except FileNotFoundError:
         logger.error(f"Configuration file {config_file} not found")
         return None
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         logger.error(f"Invalid JSON in configuration file {config_file}")
         return None
 
@@ -420,7 +863,9 @@ if __name__ == '__main__':
             'acuity_user_id': os.environ.get('ACUITY_USER_ID'),
             'acuity_api_key': os.environ.get('ACUITY_API_KEY'),
             'sync_interval': int(os.environ.get('SYNC_INTERVAL', 60)),
-            'days_to_sync': int(os.environ.get('DAYS_TO_SYNC', 30))
+            'days_to_sync': int(os.environ.get('DAYS_TO_SYNC', 30)),
+            'max_concurrency': int(os.environ.get('MAX_CONCURRENCY', 10)),
+            'patient_cache_dir': os.environ.get('PATIENT_CACHE_DIR', '.patient_cache')
         }
     
     # Check if required credentials are available
@@ -434,7 +879,9 @@ if __name__ == '__main__':
     connector = DrChronoAcuityConnector(
         config.get('drchrono_api_key'),
         config.get('acuity_user_id'),
-        config.get('acuity_api_key')
+        config.get('acuity_api_key'),
+        max_concurrency=config.get('max_concurrency', 10),
+        patient_cache_dir=config.get('patient_cache_dir', '.patient_cache')
     )
     
     # Run bidirectional sync
@@ -0,0 +1,130 @@
+import os
+import time
+import unittest
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import orjson
+
+import main
+
+
+class DuplicateDetectionTest(unittest.TestCase):
+    def setUp(self):
+        self.connector = main.DrChronoAcuityConnector('key', 'user', 'secret', patient_cache_dir=None)
+
+    def tearDown(self):
+        self.connector.io_executor.shutdown()
+        self.connector.session.close()
+
+    def test_offset_acuity_time_matches_naive_drchrono_time_in_any_server_zone(self):
+        acuity_apt = {'id': 1, 'datetime': '2026-03-02T09:00:00-0500', 'lastName': 'Doe'}
+        drchrono_apt = {'scheduled_time': '2026-03-02T09:00:00', 'patient_name': 'Jane Doe'}
+
+        original_tz = os.environ.get('TZ')
+        try:
+            for server_tz in ('UTC', 'America/New_York', 'Asia/Tokyo'):
+                os.environ['TZ'] = server_tz
+                if hasattr(time, 'tzset'):
+                    time.tzset()
+                main.iso_to_wall_clock_seconds.cache_clear()
+
+                drchrono_index = self.connector._build_time_index([drchrono_apt], 'scheduled_time')
+                self.assertTrue(self.connector._exists_in_drchrono(acuity_apt, drchrono_index), server_tz)
+        finally:
+            if original_tz is None:
+                os.environ.pop('TZ', None)
+            else:
+                os.environ['TZ'] = original_tz
+            if hasattr(time, 'tzset'):
+                time.tzset()
+            main.iso_to_wall_clock_seconds.cache_clear()
+
+    def test_converted_acuity_appointment_is_detected_on_next_sync(self):
+        acuity_apt = {'id': 1, 'datetime': '2026-03-02T09:00:00-0500', 'lastName': 'Doe', 'firstName': 'Jane'}
+        converted = self.connector.convert_acuity_to_drchrono(acuity_apt, patient_id=42)
+        converted['patient_name'] = 'Jane Doe'
+
+        drchrono_index = self.connector._build_time_index([converted], 'scheduled_time')
+        self.assertTrue(self.connector._exists_in_drchrono(acuity_apt, drchrono_index))
+
+    def test_appointments_outside_window_are_not_duplicates(self):
+        acuity_apt = {'id': 1, 'datetime': '2026-03-02T09:05:00-0500', 'lastName': 'Doe'}
+        drchrono_apt = {'scheduled_time': '2026-03-02T09:00:00', 'patient_name': 'Jane Doe'}
+
+        drchrono_index = self.connector._build_time_index([drchrono_apt], 'scheduled_time')
+        self.assertFalse(self.connector._exists_in_drchrono(acuity_apt, drchrono_index))
+
+
+class BulkPatientLookupTest(unittest.TestCase):
+    def setUp(self):
+        self.connector = main.DrChronoAcuityConnector('key', 'user', 'secret', patient_cache_dir=None)
+        self.requests = []
+        self.connector.session = httpx.Client(transport=httpx.MockTransport(self._handle))
+
+    def tearDown(self):
+        self.connector.io_executor.shutdown()
+        self.connector.session.close()
+
+    def _handle(self, request):
+        self.requests.append(request)
+        page = int(parse_qs(urlsplit(str(request.url)).query).get('page', ['1'])[0])
+        next_url = f'https://drchrono.com/api/patients?page={page + 1}&page_size=2' if page < 3 else None
+        results = [{'id': 2 * page - 1, 'last_name': 'Doe', 'ssn': 'x'}, {'id': 2 * page, 'last_name': 'Roe', 'ssn': 'y'}]
+        body = {'count': 6, 'next': next_url, 'results': results}
+        return httpx.Response(200, content=orjson.dumps(body), headers={'ETag': f'"{page}"'})
+
+    def test_unlisted_patient_does_not_trigger_repeated_directory_scans(self):
+        patients = self.connector.get_drchrono_patients_bulk({1, 99})
+        self.assertEqual(set(patients), {1})
+        self.assertEqual(len(self.requests), 3)
+
+        self.requests.clear()
+        self.connector._patient_cache.clear()
+        self.connector.get_drchrono_patients_bulk({99})
+        self.assertEqual(self.requests, [])
+
+    def test_directory_pages_are_not_kept_in_http_cache(self):
+        self.connector.get_drchrono_patients_bulk({5})
+        self.assertEqual(self.connector._http_cache, {})
+        self.assertNotIn('ssn', self.connector._patient_cache[5][1])
+
+
+class BulkPatientLookupFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.connector = main.DrChronoAcuityConnector('key', 'user', 'secret', patient_cache_dir=None)
+        self.created = []
+        self.connector.session = httpx.Client(transport=httpx.MockTransport(self._handle))
+
+    def tearDown(self):
+        self.connector.io_executor.shutdown()
+        self.connector.session.close()
+
+    def _handle(self, request):
+        path = request.url.path
+        if path == '/api/appointments':
+            body = {'count': 1, 'next': None, 'results': [
+                {'id': 10, 'scheduled_time': '2026-03-02T09:00:00', 'patient': 7, 'reason': 'Checkup'}
+            ]}
+        elif path == '/api/patients':
+            return httpx.Response(403, content=b'{"detail": "forbidden"}')
+        elif path == '/api/patients/7':
+            body = {'id': 7, 'first_name': 'Jane', 'last_name': 'Doe', 'email': '', 'phone': ''}
+        elif path == '/api/v1/appointments' and request.method == 'GET':
+            body = []
+        elif path == '/api/v1/appointment-types':
+            body = [{'id': 3, 'name': 'Checkup'}]
+        elif path == '/api/v1/appointments':
+            self.created.append(orjson.loads(request.content))
+            return httpx.Response(201, content=orjson.dumps({'id': 1}))
+        else:
+            return httpx.Response(404)
+        return httpx.Response(200, content=orjson.dumps(body))
+
+    def test_forbidden_listing_falls_back_to_per_id_lookup(self):
+        self.assertEqual(self.connector.sync_drchrono_to_acuity(), 1)
+        self.assertEqual(self.created[0]['lastName'], 'Doe')
+
+
+if __name__ == '__main__':
+    unittest.main()